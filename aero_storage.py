@@ -0,0 +1,164 @@
+# 📦 aero_storage.py (Per-Run Workspaces, Retention + Disk Quotas for processed/)
+
+import os
+import time
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+from uuid import uuid4
+
+
+# ⚙️ Storage configuration (override via environment on shared servers)
+STORAGE_ROOT = os.environ.get("AEROAI_STORAGE_ROOT", "processed")
+RETENTION_HOURS = float(os.environ.get("AEROAI_RETENTION_HOURS", 72))
+MAX_STORAGE_MB = float(os.environ.get("AEROAI_MAX_STORAGE_MB", 2048))
+
+RUN_PREFIX = "run_"
+STAGING_PREFIX = ".staging_"
+IN_PROGRESS_MARKER = ".in_progress"
+
+
+# 📏 Size helpers
+# Other sessions may be cleaning up the same runs concurrently, so a file that
+# vanishes mid-walk is treated as already gone rather than as an error.
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def path_size(path):
+    path = Path(path)
+    if path.is_file():
+        return file_size(path)
+    if not path.is_dir():
+        return 0
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += file_size(os.path.join(dirpath, name))
+    return total
+
+def format_bytes(num_bytes):
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def remove_path(path):
+    path = Path(path)
+    freed = path_size(path)
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+    return freed
+
+
+# 🗂️ Per-run workspaces
+def start_run(save_dir=STORAGE_ROOT):
+    root = Path(save_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    # Build the workspace under a staging name with the marker already inside, then
+    # rename it, so retention never sees a run_* directory without its marker
+    run_name = f"{RUN_PREFIX}{datetime.now():%Y%m%d-%H%M%S}_{uuid4().hex[:6]}"
+    staging_dir = root / f"{STAGING_PREFIX}{run_name}"
+    staging_dir.mkdir()
+    (staging_dir / IN_PROGRESS_MARKER).touch()
+
+    run_dir = root / run_name
+    staging_dir.rename(run_dir)
+    return run_dir
+
+def finish_run(run_dir, intermediates=(), retention_hours=RETENTION_HOURS, max_storage_mb=MAX_STORAGE_MB):
+    # Evict intermediates once final results exist, then apply retention to older runs
+    run_dir = Path(run_dir)
+    bytes_written = path_size(run_dir)
+    bytes_evicted = sum(remove_path(p) for p in intermediates)
+
+    (run_dir / IN_PROGRESS_MARKER).unlink(missing_ok=True)
+
+    bytes_reclaimed = enforce_retention(
+        run_dir.parent,
+        retention_hours=retention_hours,
+        max_storage_mb=max_storage_mb,
+        keep=(run_dir,)
+    )
+
+    report = {
+        'run': run_dir.name,
+        'bytes_written': bytes_written,
+        'bytes_evicted': bytes_evicted,
+        'bytes_retained': path_size(run_dir),
+        'bytes_reclaimed': bytes_reclaimed
+    }
+    print(f"💾 Run {run_dir.name}: wrote {format_bytes(bytes_written)}, "
+          f"evicted {format_bytes(bytes_evicted)}, reclaimed {format_bytes(bytes_reclaimed)} from old runs")
+    return report
+
+
+@contextmanager
+def run_workspace(save_dir=STORAGE_ROOT, reports=None, report_key=None):
+    # Yields (run_dir, intermediates); the run is always finished, even if the pipeline fails,
+    # and its storage report is stored in reports[report_key] (e.g. st.session_state)
+    run_dir = start_run(save_dir)
+    intermediates = []
+    try:
+        yield run_dir, intermediates
+    finally:
+        report = finish_run(run_dir, intermediates=intermediates)
+        if reports is not None:
+            reports[report_key] = report
+
+
+# 🧹 Retention + quota enforcement
+def enforce_retention(save_dir=STORAGE_ROOT, retention_hours=RETENTION_HOURS, max_storage_mb=MAX_STORAGE_MB, keep=()):
+    root = Path(save_dir)
+    if not root.is_dir():
+        return 0
+
+    keep = {Path(p).resolve() for p in keep}
+    now = time.time()
+    max_age = retention_hours * 3600
+    freed = 0
+
+    runs = []
+    for run_dir in root.glob(f"{RUN_PREFIX}*"):
+        if not run_dir.is_dir() or run_dir.resolve() in keep:
+            continue
+        try:
+            age = now - run_dir.stat().st_mtime
+        except OSError:
+            continue
+        # Runs still being processed by another session are left alone until they go stale
+        if (run_dir / IN_PROGRESS_MARKER).exists() and age < max_age:
+            continue
+        runs.append((age, run_dir))
+
+    # Oldest first
+    runs.sort(key=lambda r: r[0], reverse=True)
+
+    remaining = []
+    for age, run_dir in runs:
+        if age >= max_age:
+            freed += remove_path(run_dir)
+        else:
+            remaining.append((run_dir, path_size(run_dir)))
+
+    # Only completed run workspaces count toward the quota; legacy top-level
+    # outputs and in-progress runs are outside what this policy can evict
+    max_bytes = max_storage_mb * 1024 * 1024
+    total = sum(path_size(p) for p in keep) + sum(size for _, size in remaining)
+    for run_dir, size in remaining:
+        if total <= max_bytes:
+            break
+        # Subtract the size recorded at scan time: if another session already removed
+        # this run, it is still gone and the next-oldest run must not be evicted for it
+        freed += remove_path(run_dir)
+        total -= size
+
+    return freed
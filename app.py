@@ -8,10 +8,10 @@ from aero_utils import (
     link_anomalies_to_panels,
     process_video_file
 )
+from aero_storage import format_bytes
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
-import glob
 
 st.set_page_config(page_title="AeroAI - AI Solar Panel Inspection", layout="wide")
 
@@ -63,7 +63,9 @@ with tabs[1]:
                 st.markdown("✅ Video Processing Complete")
 
             else:
-                panel_image_path, anomaly_image_path = process_image_file(uploaded_file, panel_model, ANOMALY_MODEL_PATH)
+                panel_image_path, anomaly_image_path, panel_output_dir, anomaly_output_dir = process_image_file(
+                    uploaded_file, panel_model, ANOMALY_MODEL_PATH
+                )
 
                 # Safely display panel image
                 if panel_image_path and Path(panel_image_path).exists():
@@ -81,15 +83,12 @@ with tabs[1]:
 
                 st.markdown("✅ Image Processing Complete")
 
-                # Match label filenames even if .png or .jpeg
+                # Match label filenames even if .png or .jpeg (labels are always <stem>.txt in each detector's output dir)
                 image_stem = Path(uploaded_file.name).stem
-                panel_label_candidates = sorted(glob.glob(f"processed/panel*/labels/{image_stem}.txt"), reverse=True)
-                anomaly_label_candidates = sorted(glob.glob(f"processed/anomaly*/labels/{image_stem}.txt"), reverse=True)
+                panel_label_path = panel_output_dir / "labels" / f"{image_stem}.txt"
+                anomaly_label_path = anomaly_output_dir / "labels" / f"{image_stem}.txt"
 
-                panel_label_path = Path(panel_label_candidates[0]) if panel_label_candidates else None
-                anomaly_label_path = Path(anomaly_label_candidates[0]) if anomaly_label_candidates else None
-
-                if panel_label_path and panel_label_path.exists() and anomaly_label_path and anomaly_label_path.exists():
+                if panel_label_path.exists() and anomaly_label_path.exists():
                     panel_class_map = {0: 'panel'}
                     anomaly_class_map = {0: 'cracked', 1: 'dusty', 2: 'normal'}
 
@@ -101,6 +100,14 @@ with tabs[1]:
                 else:
                     st.warning(f"Label files not found for {uploaded_file.name}. Skipping detailed analysis.")
 
+            storage_report = st.session_state.get(f'storage_report_{uploaded_file.name}')
+            if storage_report:
+                st.caption(
+                    f"💾 Run `{storage_report['run']}`: wrote {format_bytes(storage_report['bytes_written'])}, "
+                    f"kept {format_bytes(storage_report['bytes_retained'])}, "
+                    f"reclaimed {format_bytes(storage_report['bytes_evicted'] + storage_report['bytes_reclaimed'])}"
+                )
+
 # Combined Result
 with tabs[2]:
     st.header("🖼️ Combined Result Viewer")
@@ -116,9 +123,15 @@ with tabs[2]:
             anomaly_path = st.session_state.get(anomaly_key, None)
 
             st.subheader(f"🖼️ Image: {image_name}")
-            st.image(panel_path, caption="Panel Detection", use_container_width=True)
+            if not panel_path:
+                st.warning("Panel detection image was not generated for this image.")
+            elif not Path(panel_path).exists():
+                # Older runs may have been removed by the retention policy
+                st.warning("Panel detection image has expired from storage.")
+            else:
+                st.image(panel_path, caption="Panel Detection", use_container_width=True)
 
-            if anomaly_path:
+            if anomaly_path and Path(anomaly_path).exists():
                 st.image(anomaly_path, caption="Anomaly Detection", use_container_width=True)
 
             panel_anomaly_key = f'panel_anomaly_map_{image_name}'
@@ -140,7 +153,7 @@ with tabs[2]:
             video_key = f'anomaly_video_{video_stem}'
             thumb_key = f'anomaly_video_frame_{video_stem}'
 
-            if video_key in st.session_state:
+            if video_key in st.session_state and Path(st.session_state[video_key]).exists():
                 st.video(st.session_state[video_key], format="video/mp4")
 
             thumb_path = st.session_state.get(thumb_key)
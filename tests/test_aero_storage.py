@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+
+import pytest
+
+import aero_storage
+from aero_storage import (
+    IN_PROGRESS_MARKER,
+    enforce_retention,
+    finish_run,
+    path_size,
+    run_workspace,
+    start_run,
+)
+
+MB = 1024 * 1024
+
+
+def make_run(root, size=0, age_hours=0, in_progress=False):
+    run_dir = start_run(root)
+    if size:
+        (run_dir / "output.mp4").write_bytes(b"x" * size)
+    if not in_progress:
+        (run_dir / IN_PROGRESS_MARKER).unlink()
+    mtime = time.time() - age_hours * 3600
+    os.utime(run_dir, (mtime, mtime))
+    return run_dir
+
+
+def test_expired_runs_are_removed(tmp_path):
+    old = make_run(tmp_path, size=100, age_hours=80)
+    fresh = make_run(tmp_path, size=100, age_hours=1)
+
+    freed = enforce_retention(tmp_path, retention_hours=72, max_storage_mb=100)
+
+    assert freed == 100
+    assert not old.exists()
+    assert fresh.exists()
+
+
+def test_quota_evicts_oldest_first_until_under_limit(tmp_path):
+    oldest = make_run(tmp_path, size=MB, age_hours=3)
+    middle = make_run(tmp_path, size=MB, age_hours=2)
+    newest = make_run(tmp_path, size=MB, age_hours=1)
+
+    enforce_retention(tmp_path, retention_hours=72, max_storage_mb=2)
+
+    assert not oldest.exists()
+    assert middle.exists()
+    assert newest.exists()
+
+
+def test_quota_ignores_files_outside_run_workspaces(tmp_path):
+    (tmp_path / "panel_video").mkdir()
+    (tmp_path / "panel_video" / "legacy.mp4").write_bytes(b"x" * 3 * MB)
+    run_dir = make_run(tmp_path, size=MB, age_hours=1)
+
+    assert enforce_retention(tmp_path, retention_hours=72, max_storage_mb=2) == 0
+    assert run_dir.exists()
+
+
+def test_in_progress_runs_are_skipped_until_stale(tmp_path):
+    busy = make_run(tmp_path, size=MB, age_hours=1, in_progress=True)
+    stale = make_run(tmp_path, size=MB, age_hours=80, in_progress=True)
+
+    enforce_retention(tmp_path, retention_hours=72, max_storage_mb=0)
+
+    assert busy.exists()
+    assert not stale.exists()
+
+
+def test_new_run_has_marker_as_soon_as_it_is_visible(tmp_path):
+    run_dir = start_run(tmp_path)
+
+    assert run_dir.name.startswith(aero_storage.RUN_PREFIX)
+    assert (run_dir / IN_PROGRESS_MARKER).exists()
+    assert [p.name for p in tmp_path.iterdir()] == [run_dir.name]
+
+    enforce_retention(tmp_path, retention_hours=72, max_storage_mb=0)
+    assert run_dir.exists()
+
+
+def test_keep_is_respected(tmp_path):
+    kept = make_run(tmp_path, size=MB, age_hours=80)
+    other = make_run(tmp_path, size=MB, age_hours=80)
+
+    enforce_retention(tmp_path, retention_hours=72, max_storage_mb=0, keep=(kept,))
+
+    assert kept.exists()
+    assert not other.exists()
+
+
+def test_finish_run_report_adds_up(tmp_path):
+    old = make_run(tmp_path, size=500, age_hours=80)
+    run_dir = start_run(tmp_path)
+    upload = run_dir / "upload.mp4"
+    upload.write_bytes(b"x" * 1000)
+    (run_dir / "labels").mkdir()
+    (run_dir / "labels" / "frame_1.txt").write_bytes(b"x" * 200)
+    (run_dir / "result.mp4").write_bytes(b"x" * 300)
+
+    report = finish_run(run_dir, intermediates=[upload, run_dir / "labels"], retention_hours=72, max_storage_mb=100)
+
+    assert report["run"] == run_dir.name
+    assert report["bytes_written"] == 1500
+    assert report["bytes_evicted"] == 1200
+    assert report["bytes_retained"] == 300
+    assert report["bytes_written"] == report["bytes_evicted"] + report["bytes_retained"]
+    assert report["bytes_reclaimed"] == 500
+    assert not old.exists()
+    assert not (run_dir / IN_PROGRESS_MARKER).exists()
+    assert path_size(run_dir) == 300
+
+
+def test_run_workspace_finishes_run_even_when_pipeline_fails(tmp_path):
+    reports = {}
+
+    with pytest.raises(RuntimeError):
+        with run_workspace(tmp_path, reports, "storage_report_video.mp4") as (run_dir, intermediates):
+            upload = run_dir / "upload.mp4"
+            upload.write_bytes(b"x" * 1000)
+            intermediates.append(upload)
+            raise RuntimeError("detector failed")
+
+    assert not upload.exists()
+    assert not (run_dir / IN_PROGRESS_MARKER).exists()
+    assert reports["storage_report_video.mp4"]["bytes_evicted"] == 1000
+
+
+def test_missing_paths_count_as_already_removed(tmp_path):
+    assert path_size(tmp_path / "gone") == 0
+    assert aero_storage.remove_path(tmp_path / "gone") == 0
+
+
+def test_concurrent_cleanup_does_not_raise(tmp_path):
+    for _ in range(20):
+        run_dir = make_run(tmp_path, age_hours=80)
+        labels = run_dir / "labels"
+        labels.mkdir()
+        for i in range(200):
+            (labels / f"frame_{i}.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+        os.utime(run_dir, (time.time() - 80 * 3600,) * 2)
+
+    errors = []
+
+    def cleanup():
+        try:
+            enforce_retention(tmp_path, retention_hours=72, max_storage_mb=100)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=cleanup) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert list(tmp_path.glob("run_*")) == []
+
+
+def test_runs_removed_by_another_session_still_count_toward_quota(tmp_path, monkeypatch):
+    oldest = make_run(tmp_path, size=MB, age_hours=3)
+    middle = make_run(tmp_path, size=MB, age_hours=2)
+    newest = make_run(tmp_path, size=MB, age_hours=1)
+
+    remove_path = aero_storage.remove_path
+
+    def removed_by_other_session_first(path):
+        # Another session deletes the oldest run just before this one reaches it
+        if path == oldest:
+            remove_path(path)
+        return remove_path(path)
+
+    monkeypatch.setattr(aero_storage, "remove_path", removed_by_other_session_first)
+
+    freed = enforce_retention(tmp_path, retention_hours=72, max_storage_mb=2)
+
+    assert freed == 0
+    assert [oldest.exists(), middle.exists(), newest.exists()] == [False, True, True]